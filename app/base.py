@@ -0,0 +1,13 @@
+"""
+Declarative Base Module
+
+This module defines the SQLAlchemy declarative base shared by all models.
+It is kept separate from database.py so models can be imported without
+creating an engine or requiring DATABASE_URL.
+"""
+
+from sqlalchemy.orm import declarative_base
+
+# Base class for our database models
+# All database models will inherit from this
+Base = declarative_base()
@@ -0,0 +1,98 @@
+"""
+Paste Cache Module
+
+This module provides a small in-process cache for paste content.
+It lets the HTML view serve popular pastes without a database round-trip.
+"""
+
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+
+class PasteCache:
+    """
+    Bounded LRU cache of paste content with a per-entry time-to-live.
+
+    Entries are keyed by paste ID and hold the paste content together with
+    its expiry timestamp, so callers can still reject expired pastes on a
+    cache hit. The cache is process-local; each worker keeps its own copy.
+
+    Attributes:
+        max_entries (int): Maximum number of pastes kept in memory
+        ttl_seconds (float): How long an entry may be served before it
+                             has to be reloaded from the database
+        max_content_length (int): Pastes larger than this are never cached
+
+    Example:
+        cache = PasteCache(max_entries=100, ttl_seconds=60)
+        cache.set("abc123", "Hello, World!", None)
+        cache.get("abc123")  # ("Hello, World!", None)
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 60,
+                 max_content_length: int = 64 * 1024):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_content_length = max_content_length
+        self._entries = OrderedDict()
+
+    def get(self, paste_id: str) -> Optional[Tuple[str, Optional[datetime]]]:
+        """
+        Look up a paste in the cache.
+
+        Args:
+            paste_id (str): The paste ID
+
+        Returns:
+            tuple or None: (content, expires_at) if cached and fresh, else None
+        """
+        entry = self._entries.get(paste_id)
+        if entry is None:
+            return None
+
+        content, expires_at, stale_at = entry
+        if time.monotonic() >= stale_at:
+            # Entry outlived its TTL - drop it and force a reload
+            del self._entries[paste_id]
+            return None
+
+        self._entries.move_to_end(paste_id)
+        return content, expires_at
+
+    def set(self, paste_id: str, content: str, expires_at: Optional[datetime]):
+        """
+        Store a paste in the cache, evicting the least recently used entry
+        if the cache is full.
+
+        Args:
+            paste_id (str): The paste ID
+            content (str): The paste content
+            expires_at (datetime, optional): When the paste expires
+        """
+        if len(content) > self.max_content_length:
+            return
+
+        # Normalize to UTC-aware so comparisons with request time are safe
+        if expires_at is not None and expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+
+        self._entries[paste_id] = (content, expires_at, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(paste_id)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, paste_id: str):
+        """
+        Remove a paste from the cache (no-op if it isn't cached).
+
+        Args:
+            paste_id (str): The paste ID
+        """
+        self._entries.pop(paste_id, None)
+
+
+# Shared cache instance used by the HTML view route
+paste_cache = PasteCache()
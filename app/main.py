@@ -5,39 +5,178 @@ This is the core FastAPI application that handles all HTTP requests.
 It includes all API routes and HTML page handlers.
 """
 
-from fastapi import FastAPI, HTTPException, Request, Depends
-from fastapi.responses import JSONResponse, HTMLResponse
+import asyncio
+import time
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from sqlalchemy import select, update, or_, func, bindparam, true
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timezone
 
 from app import models, schemas
-from app.database import get_db, init_db, check_db_connection
+from app.cache import paste_cache
+from app.middleware import ErrorMiddleware
+from app.database import SessionLocal, init_db, check_db_connection
 from app.utils import (
+    TEST_MODE,
     generate_paste_id,
     get_current_time,
     calculate_expiry_time,
     format_datetime_iso,
+    ensure_utc,
     build_paste_url
 )
 
 # Initialize FastAPI application
+# ORJSONResponse is used by default so route return values are serialized
+# once, by orjson, instead of through the stdlib json module
 app = FastAPI(
     title="Pastebin-Lite API",
     description="A simple pastebin service for storing and sharing text",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
+# Unhandled exceptions from any route are logged and turned into a 500
+# here, so routes don't need their own try/except blocks
+app.add_middleware(ErrorMiddleware)
+
 # Set up Jinja2 templates for HTML pages
 # Use absolute path to ensure it works in all environments
 import os
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
+
+# Templates only change on deploy, so compiled templates are kept in memory
+# without re-checking the files (auto_reload=False) and their bytecode is
+# cached on disk so a fresh worker can skip parsing too
+template_env = Environment(
+    loader=FileSystemLoader(os.path.join(BASE_DIR, "templates")),
+    autoescape=True,
+    auto_reload=False,
+    cache_size=-1,
+    bytecode_cache=FileSystemBytecodeCache()
+)
+templates = Jinja2Templates(env=template_env)
+
+
+# Pastes longer than this are rendered in the threadpool, so escaping
+# a large paste doesn't hold up the event loop
+RENDER_IN_THREAD_THRESHOLD = 64 * 1024
+
+
+async def render_paste_page(request: Request, paste_id: str, content: str) -> HTMLResponse:
+    """
+    Render the paste view page.
+    
+    Small pages are rendered directly on the event loop, which is much
+    cheaper than a threadpool hop; pastes over RENDER_IN_THREAD_THRESHOLD
+    are rendered in the threadpool instead. Jinja2 automatically escapes
+    HTML to prevent XSS.
+    
+    Args:
+        request (Request): HTTP request object
+        paste_id (str): The paste ID
+        content (str): The paste content
+    
+    Returns:
+        HTMLResponse: The rendered HTML page
+    """
+    template = templates.get_template("view_paste.html")
+    context = {"request": request, "paste_id": paste_id, "content": content}
+    if len(content) > RENDER_IN_THREAD_THRESHOLD:
+        html = await run_in_threadpool(template.render, context)
+    else:
+        html = template.render(context)
+    return HTMLResponse(content=html)
 
 # Mount static files (CSS, JS, images)
 # app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# How many times create_paste retries when a generated ID already exists.
+# IDs carry 64 bits of randomness, so even one retry is extremely unlikely.
+MAX_ID_ATTEMPTS = 3
+
+# How often (in seconds) the background sweeper deactivates expired pastes
+SWEEP_INTERVAL_SECONDS = 30
+
+# Advisory lock key held by whichever worker runs a given sweep, so the
+# gunicorn workers never run the sweep UPDATE at the same time
+SWEEP_LOCK_ID = 0x70617374  # "past"
+
+# How often (in seconds) the health check actually queries the database
+HEALTH_CHECK_INTERVAL_SECONDS = 10
+
+# How long (in seconds) a health check query may take before the database
+# is reported as down (e.g. while the connection pool is exhausted)
+HEALTH_CHECK_TIMEOUT_SECONDS = 2
+
+# Result and time.monotonic() timestamp of the last health check query
+_db_ok = False
+_db_checked_at = None
+
+
+# ============================================================================
+# PREBUILT QUERIES
+# ============================================================================
+# Hot statements are built once at import time with bound parameters
+# (:pid = paste ID, :now = current time) and only executed per request.
+
+Paste = models.Paste
+
+# Increment the view counter of a live paste and deactivate it on its
+# last view, returning what the API response needs. Doing the availability
+# checks in the WHERE clause also stops two concurrent fetches from both
+# taking the final view.
+CLAIM_VIEW_STMT = (
+    update(Paste)
+    .where(Paste.id == bindparam("pid"), Paste.is_live(bindparam("now")))
+    .values(
+        current_views=Paste.current_views + 1,
+        is_active=or_(
+            Paste.max_views.is_(None),
+            Paste.current_views + 1 < Paste.max_views
+        )
+    )
+    .returning(
+        Paste.content,
+        Paste.current_views,
+        Paste.max_views,
+        Paste.expires_at
+    )
+    .execution_options(synchronize_session=False)
+)
+
+# Columns needed to explain why a paste can't be shown
+PASTE_STATUS_STMT = select(
+    Paste.current_views,
+    Paste.max_views,
+    Paste.expires_at
+).where(Paste.id == bindparam("pid"))
+
+# Deactivate every active paste whose expiry time has passed. Written to
+# match the ix_pastes_expires_at predicate so the index can serve it.
+# Pastes that run out of views are already deactivated by CLAIM_VIEW_STMT.
+SWEEP_STMT = (
+    update(Paste)
+    .where(
+        Paste.is_active == true(),
+        Paste.expires_at.is_not(None),
+        Paste.expires_at <= func.now()
+    )
+    .values(is_active=False)
+    .execution_options(synchronize_session=False)
+)
+
+# Take the sweep lock for the current transaction, if no other worker has it
+SWEEP_LOCK_STMT = select(func.pg_try_advisory_xact_lock(SWEEP_LOCK_ID))
+
 
 # ============================================================================
 # STARTUP AND SHUTDOWN EVENTS
@@ -53,11 +192,60 @@ async def startup_event():
     print("=" * 60)
     print("Starting Pastebin-Lite Application")
     print("=" * 60)
-    init_db()
+    await init_db()
+    
+    # Handlers open their sessions from here directly instead of going
+    # through a per-request Depends(get_db) generator
+    app.state.session_factory = SessionLocal
+    
+    # The sweeper uses the database clock, which would disagree with the
+    # x-test-now-ms header, so it is left off in TEST_MODE
+    if not TEST_MODE:
+        app.state.sweeper = asyncio.create_task(sweep_dead_pastes())
+    
     print("✓ Application started successfully")
     print("=" * 60)
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Stop background tasks when application shuts down.
+    """
+    sweeper = getattr(app.state, "sweeper", None)
+    if sweeper is not None:
+        sweeper.cancel()
+
+
+async def sweep_dead_pastes():
+    """
+    Periodically deactivate pastes that have expired.
+    
+    Request handlers never write to a paste just to report it as
+    unavailable; instead this loop flips is_active for all expired pastes
+    in one batched UPDATE every SWEEP_INTERVAL_SECONDS.
+    
+    Every worker runs this loop, but each sweep first takes a
+    transaction-scoped advisory lock; workers that don't get it skip
+    that round, so sweeps never contend for the same rows. A sweep that
+    follows another finds the expired range already emptied, which the
+    partial index answers without touching the table.
+    """
+    while True:
+        try:
+            async with SessionLocal() as db:
+                locked = (await db.execute(SWEEP_LOCK_STMT)).scalar()
+                if locked:
+                    result = await db.execute(SWEEP_STMT)
+                await db.commit()
+            if locked and result.rowcount:
+                print(f"✓ Deactivated {result.rowcount} expired paste(s)")
+        except Exception as e:
+            print(f"Paste sweep failed: {e}")
+        
+        await asyncio.sleep(SWEEP_INTERVAL_SECONDS)
+
+
 # ============================================================================
 # API ROUTES
 # ============================================================================
@@ -68,7 +256,7 @@ async def startup_event():
     summary="Health Check",
     description="Check if the application and database are healthy"
 )
-async def health_check(db: Session = Depends(get_db)):
+async def health_check():
     """
     Health check endpoint.
     
@@ -76,6 +264,12 @@ async def health_check(db: Session = Depends(get_db)):
     1. The application is running
     2. The database connection is working
     
+    The database is probed at most once every HEALTH_CHECK_INTERVAL_SECONDS;
+    calls in between (including those arriving while a probe is still in
+    flight) report the last result, so frequent liveness probes don't put
+    load on the database. A probe that takes longer than
+    HEALTH_CHECK_TIMEOUT_SECONDS counts as a failure.
+    
     Returns:
         JSON: {"ok": true} if healthy, {"ok": false} if unhealthy
     
@@ -87,13 +281,24 @@ async def health_check(db: Session = Depends(get_db)):
             "ok": true
         }
     """
-    try:
+    global _db_ok, _db_checked_at
+    
+    now = time.monotonic()
+    if _db_checked_at is None or now - _db_checked_at >= HEALTH_CHECK_INTERVAL_SECONDS:
+        # Claim this interval before awaiting, so concurrent calls don't
+        # start probes of their own
+        _db_checked_at = now
+        
         # Try to execute a simple database query
-        db.execute("SELECT 1")
-        return JSONResponse(content={"ok": True}, status_code=200)
-    except Exception as e:
-        print(f"Health check failed: {e}")
-        return JSONResponse(content={"ok": False}, status_code=200)
+        try:
+            _db_ok = await asyncio.wait_for(
+                check_db_connection(), HEALTH_CHECK_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            print("Database health check timed out")
+            _db_ok = False
+    
+    return {"ok": _db_ok}
 
 
 @app.post(
@@ -105,8 +310,7 @@ async def health_check(db: Session = Depends(get_db)):
 )
 async def create_paste(
     paste_data: schemas.PasteCreate,
-    request: Request,
-    db: Session = Depends(get_db)
+    request: Request
 ):
     """
     Create a new paste.
@@ -121,13 +325,12 @@ async def create_paste(
     Args:
         paste_data (PasteCreate): Paste content and optional constraints
         request (Request): HTTP request object
-        db (Session): Database session
     
     Returns:
         JSON: Paste ID and URL
     
     Raises:
-        HTTPException 400: If validation fails
+        RequestValidationError: If validation fails (returned as 400)
     
     Example:
         POST /api/pastes
@@ -143,10 +346,7 @@ async def create_paste(
             "url": "https://pastebin-lite.onrender.com/p/abc123"
         }
     """
-    try:
-        # Generate unique paste ID
-        paste_id = generate_paste_id()
-        
+    async with request.app.state.session_factory() as db:
         # Get current time for created_at
         created_at = get_current_time(request)
         
@@ -155,48 +355,44 @@ async def create_paste(
         if paste_data.ttl_seconds:
             expires_at = calculate_expiry_time(created_at, paste_data.ttl_seconds)
         
-        # Create new paste object
-        new_paste = models.Paste(
-            id=paste_id,
-            content=paste_data.content,
-            ttl_seconds=paste_data.ttl_seconds,
-            max_views=paste_data.max_views,
-            current_views=0,
-            created_at=created_at,
-            expires_at=expires_at,
-            is_active=True
-        )
-        
-        # Save to database
-        db.add(new_paste)
-        db.commit()
-        db.refresh(new_paste)
+        # The primary key constraint guarantees uniqueness, so instead of
+        # checking for an existing ID first we just retry on the (very rare)
+        # collision
+        for _ in range(MAX_ID_ATTEMPTS):
+            # Generate unique paste ID
+            paste_id = generate_paste_id()
+            
+            # Create new paste object
+            new_paste = models.Paste(
+                id=paste_id,
+                content=paste_data.content,
+                ttl_seconds=paste_data.ttl_seconds,
+                max_views=paste_data.max_views,
+                current_views=0,
+                created_at=created_at,
+                expires_at=expires_at,
+                is_active=True
+            )
+            
+            # Save to database
+            db.add(new_paste)
+            try:
+                await db.commit()
+                break
+            except IntegrityError:
+                # ID already taken - discard and try a new one
+                await db.rollback()
+        else:
+            raise RuntimeError(f"Could not generate a unique paste ID in {MAX_ID_ATTEMPTS} attempts")
         
         # Build shareable URL
         paste_url = build_paste_url(request, paste_id)
         
         # Return response
-        return JSONResponse(
-            content={
-                "id": paste_id,
-                "url": paste_url
-            },
-            status_code=200
-        )
-    
-    except ValueError as e:
-        # Validation error from Pydantic
-        return JSONResponse(
-            content={"error": str(e)},
-            status_code=400
-        )
-    except Exception as e:
-        # Unexpected error
-        print(f"Error creating paste: {e}")
-        return JSONResponse(
-            content={"error": "Internal server error"},
-            status_code=500
-        )
+        return {
+            "id": paste_id,
+            "url": paste_url
+        }
 
 
 @app.get(
@@ -207,25 +403,23 @@ async def create_paste(
 )
 async def fetch_paste(
     paste_id: str,
-    request: Request,
-    db: Session = Depends(get_db)
+    request: Request
 ):
     """
     Fetch a paste by ID.
     
     This endpoint:
-    1. Retrieves the paste from database
-    2. Checks if it's expired (using TEST_MODE if enabled)
-    3. Checks if view limit is reached
-    4. Increments the view count
-    5. Returns the paste data
+    1. Claims a view with a single atomic UPDATE ... RETURNING, which only
+       matches pastes that are active, unexpired (using TEST_MODE if
+       enabled) and under their view limit
+    2. If nothing matched, looks the paste up to report why
+    3. Returns the paste data
     
     Important: Each API fetch counts as a view!
     
     Args:
         paste_id (str): The paste ID
         request (Request): HTTP request object
-        db (Session): Database session
     
     Returns:
         JSON: Paste content, remaining views, expiry time
@@ -248,64 +442,48 @@ async def fetch_paste(
             "error": "Paste not found"
         }
     """
-    try:
+    async with request.app.state.session_factory() as db:
         # Get current time (respects TEST_MODE)
         current_time = get_current_time(request)
         
-        # Fetch paste from database
-        paste = db.query(models.Paste).filter(models.Paste.id == paste_id).first()
-        
-        # Check if paste exists
-        if not paste:
-            return JSONResponse(
-                content={"error": "Paste not found"},
-                status_code=404
-            )
+        # Claim a view in a single statement
+        result = await db.execute(CLAIM_VIEW_STMT, {"pid": paste_id, "now": current_time})
+        row = result.first()
+        await db.commit()
         
-        # Check if paste is available
-        if not paste.is_available(current_time):
-            # Mark as inactive and save
-            paste.is_active = False
-            db.commit()
+        if row is None:
+            # Paste missing or unavailable - look it up to pick the error message
+            result = await db.execute(PASTE_STATUS_STMT, {"pid": paste_id})
+            row = result.first()
+            
+            # Check if paste exists
+            if row is None:
+                raise HTTPException(status_code=404, detail="Paste not found")
             
             # Determine error message
-            if paste.is_expired(current_time):
+            expires_at = ensure_utc(row.expires_at)
+            if expires_at is not None and current_time >= expires_at:
                 error_msg = "Paste has expired"
-            elif paste.is_view_limit_reached():
+            elif row.max_views is not None and row.current_views >= row.max_views:
                 error_msg = "View limit exceeded"
             else:
                 error_msg = "Paste not available"
             
-            return JSONResponse(
-                content={"error": error_msg},
-                status_code=404
-            )
-        
-        # Increment view count
-        paste.current_views += 1
+            raise HTTPException(status_code=404, detail=error_msg)
         
-        # Check if this view reached the limit
-        if paste.is_view_limit_reached():
-            paste.is_active = False
-        
-        db.commit()
-        db.refresh(paste)
+        # Remaining views after this one (None means unlimited)
+        remaining_views = None
+        if row.max_views is not None:
+            remaining_views = max(0, row.max_views - row.current_views)
         
         # Build response
         response_data = {
-            "content": paste.content,
-            "remaining_views": paste.get_remaining_views(),
-            "expires_at": format_datetime_iso(paste.expires_at) if paste.expires_at else None
+            "content": row.content,
+            "remaining_views": remaining_views,
+            "expires_at": format_datetime_iso(row.expires_at) if row.expires_at else None
         }
         
-        return JSONResponse(content=response_data, status_code=200)
-    
-    except Exception as e:
-        print(f"Error fetching paste: {e}")
-        return JSONResponse(
-            content={"error": "Internal server error"},
-            status_code=500
-        )
+        return response_data
 
 
 # ============================================================================
@@ -328,48 +506,59 @@ async def home_page(request: Request):
 @app.get("/p/{paste_id}", response_class=HTMLResponse, summary="View Paste")
 async def view_paste(
     paste_id: str,
-    request: Request,
-    db: Session = Depends(get_db)
+    request: Request
 ):
     """
     View a paste as HTML.
     
     This endpoint displays the paste content in a web page.
-    Note: This does NOT count as a view (unlike the API endpoint).
+    Pastes without a view limit are served from an in-process cache
+    after the first load, so repeat views skip the database.
     
     Args:
         paste_id (str): The paste ID
         request (Request): HTTP request object
-        db (Session): Database session
     
     Returns:
         HTML: Page displaying paste content
         HTML 404: If paste not found or unavailable
     """
-    try:
+    async with request.app.state.session_factory() as db:
         # Get current time (respects TEST_MODE)
         current_time = get_current_time(request)
         
-        # Fetch paste from database
-        paste = db.query(models.Paste).filter(models.Paste.id == paste_id).first()
+        # Serve from cache when possible (only unlimited-view pastes are cached)
+        cached = paste_cache.get(paste_id)
+        if cached is not None:
+            content, expires_at = cached
+            if expires_at is None or current_time < expires_at:
+                return await render_paste_page(request, paste_id, content)
+            # Expired since it was cached - fall through to the database
+            paste_cache.invalidate(paste_id)
         
-        # Check if paste exists
-        if not paste:
-            return HTMLResponse(
-                content="<html><body><h1>404 - Paste Not Found</h1></body></html>",
-                status_code=404
-            )
+        # Claim a view in a single statement, so two concurrent views
+        # can't both take the last one
+        result = await db.execute(CLAIM_VIEW_STMT, {"pid": paste_id, "now": current_time})
+        paste = result.first()
+        await db.commit()
         
-        # Check if paste is available
-        if not paste.is_available(current_time):
-            # Mark as inactive
-            paste.is_active = False
-            db.commit()
+        if paste is None:
+            # Paste missing or unavailable - look it up to pick the error message
+            result = await db.execute(PASTE_STATUS_STMT, {"pid": paste_id})
+            row = result.first()
+            
+            # Check if paste exists
+            if row is None:
+                return HTMLResponse(
+                    content="<html><body><h1>404 - Paste Not Found</h1></body></html>",
+                    status_code=404
+                )
             
             # Determine error message
-            if paste.is_expired(current_time):
+            expires_at = ensure_utc(row.expires_at)
+            if expires_at is not None and current_time >= expires_at:
                 error_msg = "Paste Has Expired"
-            elif paste.is_view_limit_reached():
+            elif row.max_views is not None and row.current_views >= row.max_views:
                 error_msg = "View Limit Exceeded"
             else:
                 error_msg = "Paste Not Available"
@@ -379,63 +568,41 @@ async def view_paste(
                 status_code=404
             )
         
-        # Increment view count for HTML views
-        paste.current_views += 1
-        
-        # Check if this view reached the limit
-        if paste.is_view_limit_reached():
-            paste.is_active = False
-        
-        db.commit()
-        db.refresh(paste)
+        # Pastes without a view limit can't be exhausted by views,
+        # so later loads can be answered from the cache
+        if paste.max_views is None:
+            paste_cache.set(paste_id, paste.content, paste.expires_at)
         
         # Render the paste view page
-        # Jinja2 automatically escapes HTML to prevent XSS
-        return templates.TemplateResponse(
-            "view_paste.html",
-            {
-                "request": request,
-                "paste_id": paste_id,
-                "content": paste.content
-            }
-        )
-    
-    except Exception as e:
-        # Log the full error for debugging
-        import traceback
-        print(f"Error viewing paste: {e}")
-        print(traceback.format_exc())
-        return HTMLResponse(
-            content=f"<html><body><h1>500 - Internal Server Error</h1><p>Error: {str(e)}</p></body></html>",
-            status_code=500
-        )
+        return await render_paste_page(request, paste_id, paste.content)
 
 
 # ============================================================================
 # ERROR HANDLERS
 # ============================================================================
 
-@app.exception_handler(422)
-async def validation_exception_handler(request: Request, exc):
+@app.exception_handler(StarletteHTTPException)
+async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     """
-    Handle Pydantic validation errors.
+    Handle HTTP errors raised by routes (and by routing itself, e.g. 404).
     
-    Returns a 400 Bad Request with error details.
+    Returns the error in the API's {"error": "..."} format.
     """
-    return JSONResponse(
-        content={"error": "Invalid input"},
-        status_code=400
+    return ORJSONResponse(
+        content={"error": exc.detail},
+        status_code=exc.status_code,
+        headers=getattr(exc, "headers", None)
     )
 
 
-@app.exception_handler(500)
-async def internal_error_handler(request: Request, exc):
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """
-    Handle internal server errors.
+    Handle Pydantic validation errors.
     
-    Returns a 500 Internal Server Error.
+    Returns a 400 Bad Request with error details.
     """
-    return JSONResponse(
-        content={"error": "Internal server error"},
-        status_code=500
+    return ORJSONResponse(
+        content={"error": "Invalid input"},
+        status_code=400
     )
@@ -0,0 +1,69 @@
+"""
+Middleware Module
+
+This module contains ASGI middleware used by the application.
+Middleware here is written against the raw ASGI interface rather than
+Starlette's BaseHTTPMiddleware, so it adds no per-request buffering.
+"""
+
+import traceback
+
+
+class ErrorMiddleware:
+    """
+    Turn unhandled exceptions into 500 responses.
+
+    Routes don't wrap their bodies in try/except; anything they don't
+    handle ends up here, is logged once with its traceback, and is
+    answered with a 500. API paths (/api/...) get the JSON error format,
+    everything else a small HTML page.
+
+    If the response has already started (e.g. a streamed body failed
+    half way), there is nothing sensible left to send, so the exception
+    is re-raised for the server to close the connection.
+
+    Usage:
+        app.add_middleware(ErrorMiddleware)
+    """
+
+    JSON_BODY = b'{"error":"Internal server error"}'
+    HTML_BODY = b"<html><body><h1>500 - Internal Server Error</h1></body></html>"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            print(f"Unhandled error on {scope['path']}: {e!r}")
+            print(traceback.format_exc())
+            if response_started:
+                raise
+
+            if scope["path"].startswith("/api/"):
+                body, content_type = self.JSON_BODY, b"application/json"
+            else:
+                body, content_type = self.HTML_BODY, b"text/html; charset=utf-8"
+
+            await send({
+                "type": "http.response.start",
+                "status": 500,
+                "headers": [
+                    (b"content-type", content_type),
+                    (b"content-length", str(len(body)).encode("ascii"))
+                ]
+            })
+            await send({"type": "http.response.body", "body": body})
@@ -5,10 +5,12 @@ This module defines the database schema using SQLAlchemy ORM.
 Each model class represents a table in the PostgreSQL database.
 """
 
-from sqlalchemy import Column, String, Integer, Text, DateTime, Boolean
+from sqlalchemy import Column, String, Integer, Text, DateTime, Boolean, Index, text, true, and_, or_
+from sqlalchemy.ext.hybrid import hybrid_method
 from sqlalchemy.types import TIMESTAMP
+import time
 from datetime import datetime, timezone
-from app.database import Base
+from app.base import Base
 
 
 class Paste(Base):
@@ -40,9 +42,24 @@ class Paste(Base):
     # Table name in PostgreSQL
     __tablename__ = "pastes"
     
+    # Partial indexes that only cover live pastes.
+    # Most pastes eventually expire or run out of views, so these stay
+    # much smaller than full-table indexes and remain in memory.
+    __table_args__ = (
+        # Lookups by ID of active pastes
+        Index("pastes_active_idx", "id", postgresql_where=text("is_active = true")),
+        # Finding active pastes whose expiry time has passed (cleanup)
+        Index(
+            "ix_pastes_expires_at",
+            "expires_at",
+            postgresql_where=text("is_active = true AND expires_at IS NOT NULL")
+        ),
+    )
+    
     # Primary key - unique identifier for each paste
-    # We'll generate this using secrets.token_urlsafe()
-    id = Column(String(50), primary_key=True, index=True)
+    # Generated by utils.generate_paste_id() from os.urandom() bytes
+    # (primary keys are indexed automatically, no extra index needed)
+    id = Column(String(50), primary_key=True)
     
     # The actual paste content - can be very large text
     content = Column(Text, nullable=False)
@@ -91,15 +108,16 @@ class Paste(Base):
         if not self.expires_at:
             return False  # No expiry time set
         
-        if current_time is None:
-            current_time = datetime.now(timezone.utc)
-        
         # Ensure both datetimes are timezone-aware for comparison
         expires_at = self.expires_at
         if expires_at.tzinfo is None:
             # Database stored as naive, make it UTC-aware
             expires_at = expires_at.replace(tzinfo=timezone.utc)
         
+        if current_time is None:
+            # Compare epoch seconds instead of building an aware "now" datetime
+            return time.time() >= expires_at.timestamp()
+        
         if current_time.tzinfo is None:
             # Make current_time UTC-aware if it's naive
             current_time = current_time.replace(tzinfo=timezone.utc)
@@ -139,6 +157,40 @@ class Paste(Base):
         
         return True
     
+    @hybrid_method
+    def is_live(self, current_time):
+        """
+        Check if the paste is live (active, unexpired and under view limit).
+        
+        On an instance this is the same as is_available(). On the class
+        it builds the equivalent SQL predicate, so queries can filter out
+        dead pastes in the database instead of loading them first.
+        
+        Args:
+            current_time (datetime): Current time (respects TEST_MODE)
+        
+        Returns:
+            bool: True if live, False otherwise
+        
+        Example:
+            select(Paste).where(Paste.id == paste_id, Paste.is_live(now))
+        """
+        return self.is_available(current_time)
+    
+    @is_live.expression
+    def is_live(cls, current_time):
+        """
+        SQL expression form of is_live().
+        
+        is_active is compared with "= true" rather than "IS TRUE" so the
+        condition matches the partial index predicates in __table_args__.
+        """
+        return and_(
+            cls.is_active == true(),
+            or_(cls.expires_at.is_(None), cls.expires_at > current_time),
+            or_(cls.max_views.is_(None), cls.current_views < cls.max_views)
+        )
+    
     def get_remaining_views(self):
         """
         Calculate remaining views before limit is reached.
@@ -0,0 +1,29 @@
+-- Pastebin-Lite database schema
+--
+-- Executed by init_db() on startup. Every statement is guarded so running
+-- it against an existing database is a no-op. Keep in sync with models.py.
+-- init_db() splits the script on semicolons, so keep them out of comments.
+
+CREATE TABLE IF NOT EXISTS pastes (
+    id VARCHAR(50) PRIMARY KEY,
+    content TEXT NOT NULL,
+    ttl_seconds INTEGER,
+    max_views INTEGER,
+    current_views INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    expires_at TIMESTAMP WITH TIME ZONE,
+    is_active BOOLEAN NOT NULL
+);
+
+-- Redundant with the primary key (created by older versions of the app)
+DROP INDEX IF EXISTS ix_pastes_id;
+
+-- Lookups by ID of active pastes
+CREATE INDEX IF NOT EXISTS pastes_active_idx
+    ON pastes (id)
+    WHERE is_active = true;
+
+-- Finding active pastes whose expiry time has passed (cleanup)
+CREATE INDEX IF NOT EXISTS ix_pastes_expires_at
+    ON pastes (expires_at)
+    WHERE is_active = true AND expires_at IS NOT NULL;
@@ -5,10 +5,14 @@ This module defines Pydantic models for request/response validation.
 These schemas ensure data is valid before it reaches the database.
 """
 
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import Optional
 from datetime import datetime
 
+# Largest paste accepted, in characters (1 MiB of ASCII text).
+# Enforced by pydantic-core before any Python validator runs.
+MAX_CONTENT_LENGTH = 1_048_576
+
 
 class PasteCreate(BaseModel):
     """
@@ -17,7 +21,7 @@ class PasteCreate(BaseModel):
     This validates the incoming POST request to /api/pastes
     
     Fields:
-        content (str): The paste content (required, non-empty)
+        content (str): The paste content (required, non-empty, at most 1 MiB)
         ttl_seconds (int, optional): Time-to-live in seconds (must be >= 1)
         max_views (int, optional): Maximum views allowed (must be >= 1)
     
@@ -29,12 +33,13 @@ class PasteCreate(BaseModel):
         }
     """
     
-    content: str = Field(..., description="The paste content")
+    content: str = Field(..., max_length=MAX_CONTENT_LENGTH, description="The paste content")
     ttl_seconds: Optional[int] = Field(None, description="Time-to-live in seconds")
     max_views: Optional[int] = Field(None, description="Maximum number of views")
     
-    @validator('content')
-    def content_not_empty(cls, v):
+    @field_validator('content')
+    @classmethod
+    def content_not_empty(cls, v: str) -> str:
         """
         Validate that content is not empty or just whitespace.
         
@@ -47,12 +52,14 @@ class PasteCreate(BaseModel):
         Raises:
             ValueError: If content is empty or whitespace
         """
-        if not v or not v.strip():
+        # str.isspace() scans in C without copying, unlike v.strip()
+        if not v or v.isspace():
             raise ValueError('content must be a non-empty string')
         return v
     
-    @validator('ttl_seconds')
-    def ttl_positive(cls, v):
+    @field_validator('ttl_seconds')
+    @classmethod
+    def ttl_positive(cls, v: Optional[int]) -> Optional[int]:
         """
         Validate that TTL is a positive integer.
         
@@ -69,8 +76,9 @@ class PasteCreate(BaseModel):
             raise ValueError('ttl_seconds must be >= 1')
         return v
     
-    @validator('max_views')
-    def max_views_positive(cls, v):
+    @field_validator('max_views')
+    @classmethod
+    def max_views_positive(cls, v: Optional[int]) -> Optional[int]:
         """
         Validate that max_views is a positive integer.
         
@@ -87,15 +95,15 @@ class PasteCreate(BaseModel):
             raise ValueError('max_views must be >= 1')
         return v
     
-    class Config:
-        """Pydantic configuration"""
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "content": "This is a sample paste",
                 "ttl_seconds": 3600,
                 "max_views": 5
             }
         }
+    )
 
 
 class PasteResponse(BaseModel):
@@ -118,14 +126,15 @@ class PasteResponse(BaseModel):
     id: str = Field(..., description="Unique paste identifier")
     url: str = Field(..., description="Shareable URL for the paste")
     
-    class Config:
-        """Pydantic configuration"""
-        schema_extra = {
+    model_config = ConfigDict(
+        from_attributes=True,
+        json_schema_extra={
             "example": {
                 "id": "abc123xyz",
                 "url": "https://pastebin-lite.onrender.com/p/abc123xyz"
             }
         }
+    )
 
 
 class PasteFetch(BaseModel):
@@ -151,15 +160,16 @@ class PasteFetch(BaseModel):
     remaining_views: Optional[int] = Field(None, description="Remaining views")
     expires_at: Optional[str] = Field(None, description="Expiry timestamp (ISO format)")
     
-    class Config:
-        """Pydantic configuration"""
-        schema_extra = {
+    model_config = ConfigDict(
+        from_attributes=True,
+        json_schema_extra={
             "example": {
                 "content": "This is the paste content",
                 "remaining_views": 4,
                 "expires_at": "2026-01-31T12:00:00.000Z"
             }
         }
+    )
 
 
 class HealthResponse(BaseModel):
@@ -177,13 +187,13 @@ class HealthResponse(BaseModel):
     
     ok: bool = Field(..., description="Health status")
     
-    class Config:
-        """Pydantic configuration"""
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "ok": True
             }
         }
+    )
 
 
 class ErrorResponse(BaseModel):
@@ -201,10 +211,10 @@ class ErrorResponse(BaseModel):
     
     error: str = Field(..., description="Error message")
     
-    class Config:
-        """Pydantic configuration"""
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "error": "Paste not found"
             }
         }
+    )
@@ -4,43 +4,148 @@ Utility Functions Module
 This module contains helper functions used throughout the application.
 """
 
-import secrets
+import binascii
 import os
+import threading
+from functools import lru_cache
 from datetime import datetime, timezone, timedelta
 from fastapi import Request
 
+# TEST_MODE is fixed for the life of the process, so read it once at import
+# instead of on every request
+TEST_MODE = os.environ.get("TEST_MODE") == "1"
 
-def generate_paste_id(length: int = 8) -> str:
+# Shared UTC tzinfo instance
+_UTC = timezone.utc
+
+# Unix epoch as an aware datetime, used to turn test timestamps into datetimes
+_EPOCH = datetime(1970, 1, 1, tzinfo=_UTC)
+
+# Largest x-test-now-ms value that still fits in a datetime, and its length
+# in digits (longer headers are rejected before int() ever sees them)
+_MAX_TEST_MS = (datetime.max.replace(tzinfo=_UTC) - _EPOCH) // timedelta(milliseconds=1)
+_MAX_TEST_MS_DIGITS = len(str(_MAX_TEST_MS))
+
+# Maps the standard base64 alphabet onto the URL-safe one ("+/" -> "-_")
+_URLSAFE_TRANS = bytes.maketrans(b"+/", b"-_")
+
+# Pool of os.urandom() bytes that paste IDs are sliced from, so the
+# getrandom() syscall happens once per _RANDOM_POOL_SIZE bytes rather than
+# once per ID
+_RANDOM_POOL_SIZE = 1024
+_random_pool = b""
+_random_pool_pos = 0
+_random_pool_lock = threading.Lock()
+
+
+def _reset_random_pool():
+    """
+    Discard the random byte pool.
+    
+    Registered to run in forked children, so a worker never hands out
+    bytes its parent (or a sibling) has already used.
+    """
+    global _random_pool, _random_pool_pos
+    _random_pool = b""
+    _random_pool_pos = 0
+
+
+os.register_at_fork(after_in_child=_reset_random_pool)
+
+
+def _random_bytes(length: int) -> bytes:
+    """
+    Return cryptographically secure random bytes from the pool.
+    
+    Each byte is handed out at most once; the pool is refilled from
+    os.urandom() when it runs low.
+    
+    Args:
+        length (int): Number of bytes wanted
+    
+    Returns:
+        bytes: Random bytes
+    """
+    global _random_pool, _random_pool_pos
+    with _random_pool_lock:
+        start = _random_pool_pos
+        end = start + length
+        if end > len(_random_pool):
+            _random_pool = os.urandom(max(_RANDOM_POOL_SIZE, length))
+            start, end = 0, length
+        _random_pool_pos = end
+        return _random_pool[start:end]
+
+
+def generate_paste_id(length: int = 8, _random_bytes=_random_bytes,
+                      _b2a=binascii.b2a_base64, _trans=_URLSAFE_TRANS) -> str:
     """
     Generate a cryptographically secure random paste ID.
     
-    Uses secrets.token_urlsafe() which is safe for security-sensitive operations.
-    The ID is URL-safe and contains only alphanumeric characters, hyphens, and underscores.
+    Draws bytes from os.urandom() (the same CSPRNG secrets.token_urlsafe()
+    uses, via a pooled buffer so most calls make no syscall) and
+    base64-encodes them with binascii directly, skipping the
+    Python-level wrappers in secrets and base64. The output is identical in
+    format to secrets.token_urlsafe(): URL-safe, containing only
+    alphanumeric characters, hyphens, and underscores.
+    
+    Uniqueness is enforced by the primary key rather than by looking the ID
+    up first; with 64 bits of randomness collisions are astronomically rare.
+    
+    The underscore-prefixed parameters are not meant to be passed; they
+    bind the helpers as locals so each call skips the module and builtin
+    lookups.
     
     Args:
-        length (int): Approximate length of the ID (default: 8)
+        length (int): Number of random bytes (default: 8, an 11-character ID)
     
     Returns:
         str: A random URL-safe string
     
     Example:
         >>> generate_paste_id()
-        'x4K_9mPq'
+        'x4K_9mPqZ2a'
     """
-    return secrets.token_urlsafe(length)
+    encoded = _b2a(_random_bytes(length), newline=False)
+    return encoded.rstrip(b"=").translate(_trans).decode("ascii")
 
 
-def get_current_time(request: Request) -> datetime:
+def _scope_header(scope, name: bytes) -> str:
+    """
+    Read a single header straight from the ASGI scope.
+    
+    Avoids building Starlette's Headers wrapper just for one lookup.
+    ASGI servers always deliver header names lowercased.
+    
+    Args:
+        scope (dict): ASGI connection scope
+        name (bytes): Lowercase header name, e.g. b"host"
+    
+    Returns:
+        str or None: The header value, or None if it's missing
+    """
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _get_current_time_test_mode(request: Request, _now=datetime.now, _utc=_UTC,
+                                _int=int, _len=len, _timedelta=timedelta) -> datetime:
     """
     Get the current time, with support for deterministic testing.
     
-    When TEST_MODE environment variable is set to "1", this function
-    checks for the x-test-now-ms header in the request. If present,
-    it uses that timestamp instead of the actual current time.
+    This is the TEST_MODE implementation of get_current_time. It checks
+    for the x-test-now-ms header in the request. If present, it uses that
+    timestamp instead of the actual current time.
     
     This allows automated tests to verify time-based expiry without
     waiting for actual time to pass.
     
+    The underscore-prefixed parameters are not meant to be passed; they
+    bind globals and builtins as locals once, at definition time, since
+    this function runs on every request.
+    
     Args:
         request (Request): FastAPI request object
     
@@ -48,36 +153,78 @@ def get_current_time(request: Request) -> datetime:
         datetime: Current time (or test time) in UTC timezone
     
     Example:
-        # Normal usage (returns actual time)
-        current = get_current_time(request)
-        
         # In test mode with header x-test-now-ms: 1704067200000
         # Returns: datetime(2024, 1, 1, 0, 0, 0, tzinfo=UTC)
     """
-    # Check if we're in test mode
-    test_mode = os.environ.get("TEST_MODE") == "1"
-    
-    if test_mode:
-        # Look for test time in request headers
-        test_time_ms = request.headers.get("x-test-now-ms")
-        
-        if test_time_ms:
-            try:
-                # Convert milliseconds to seconds and create datetime
-                timestamp_seconds = int(test_time_ms) / 1000
-                return datetime.fromtimestamp(timestamp_seconds, tz=timezone.utc)
-            except (ValueError, OSError):
-                # If conversion fails, fall through to real time
-                pass
+    # Look for test time in request headers
+    test_time_ms = _scope_header(request.scope, b"x-test-now-ms")
+    
+    # Only plain non-negative integers within datetime's range are
+    # accepted; anything else falls through to real time. The length check
+    # keeps huge values away from int(), which refuses over 4300 digits.
+    if (test_time_ms and _len(test_time_ms) <= _MAX_TEST_MS_DIGITS
+            and test_time_ms.isascii() and test_time_ms.isdigit()):
+        test_ms = _int(test_time_ms)
+        if test_ms <= _MAX_TEST_MS:
+            # Offset from the epoch in integer milliseconds (no float
+            # round-trip or gmtime conversion)
+            return _EPOCH + _timedelta(milliseconds=test_ms)
     
     # Return actual current time in UTC
-    return datetime.now(timezone.utc)
+    return _now(_utc)
+
+
+def _get_current_time(request: Request, _now=datetime.now, _utc=_UTC) -> datetime:
+    """
+    Get the current time in UTC.
+    
+    This is the normal (non-TEST_MODE) implementation of get_current_time;
+    the request is ignored.
+    
+    Args:
+        request (Request): FastAPI request object
+    
+    Returns:
+        datetime: Current time in UTC timezone
+    
+    Example:
+        current = get_current_time(request)
+    """
+    return _now(_utc)
+
+
+# get_current_time(request) -> datetime
+# TEST_MODE can't change while the process runs, so the right implementation
+# is picked once here rather than checking the flag on every call. With
+# TEST_MODE=1 the x-test-now-ms header is honoured; otherwise it's ignored.
+get_current_time = _get_current_time_test_mode if TEST_MODE else _get_current_time
 
 
-def calculate_expiry_time(created_at: datetime, ttl_seconds: int) -> datetime:
+@lru_cache(maxsize=16)
+def _ttl_delta(ttl_seconds: int) -> timedelta:
+    """
+    Return (and cache) the timedelta for a TTL.
+    
+    Clients tend to reuse a handful of TTLs (an hour, a day, ...), so the
+    same immutable timedelta can be shared between requests.
+    
+    Args:
+        ttl_seconds (int): Time-to-live in seconds
+    
+    Returns:
+        timedelta: The TTL as a timedelta
+    """
+    return timedelta(seconds=ttl_seconds)
+
+
+def calculate_expiry_time(created_at: datetime, ttl_seconds: int,
+                          _ttl_delta=_ttl_delta) -> datetime:
     """
     Calculate when a paste will expire based on TTL.
     
+    The underscore-prefixed parameter is not meant to be passed; it binds
+    the cached timedelta helper as a local.
+    
     Args:
         created_at (datetime): When the paste was created
         ttl_seconds (int): Time-to-live in seconds
@@ -91,9 +238,30 @@ def calculate_expiry_time(created_at: datetime, ttl_seconds: int) -> datetime:
         >>> expiry
         datetime(2024, 1, 1, 13, 0, 0, tzinfo=timezone.utc)
     """
-    return created_at + timedelta(seconds=ttl_seconds)
+    return created_at + _ttl_delta(ttl_seconds)
+
 
+def ensure_utc(dt):
+    """
+    Make a datetime read from the database UTC-aware.
 
+    Depending on the driver and column type, timestamps can come back
+    naive; comparing those with the aware current time raises
+    "can't compare offset-naive and offset-aware datetimes"
+    (see TIMEZONE_FIX.md). Naive values are assumed to be UTC.
+
+    Args:
+        dt (datetime, optional): Datetime to normalize (None is passed through)
+
+    Returns:
+        datetime or None: UTC-aware datetime, or None
+    """
+    if dt is not None and dt.tzinfo is None:
+        return dt.replace(tzinfo=_UTC)
+    return dt
+
+
+@lru_cache(maxsize=1024)
 def format_datetime_iso(dt: datetime) -> str:
     """
     Format a datetime object to ISO 8601 string with 'Z' suffix.
@@ -101,6 +269,12 @@ def format_datetime_iso(dt: datetime) -> str:
     The API specification requires timestamps in this format:
     "2026-01-01T00:00:00.000Z"
     
+    Aware datetimes in other timezones are converted to UTC first; naive
+    datetimes are assumed to already be UTC.
+    
+    Results are cached: a popular paste is fetched many times with the
+    same expires_at, and each repeat reuses the already-built string.
+    
     Args:
         dt (datetime): Datetime object to format
     
@@ -112,6 +286,13 @@ def format_datetime_iso(dt: datetime) -> str:
         >>> format_datetime_iso(dt)
         '2024-01-01T12:30:45.123Z'
     """
+    if dt.tzinfo is None:
+        # Naive datetimes have no offset to replace
+        return dt.isoformat(timespec='milliseconds') + 'Z'
+    
+    if dt.tzinfo is not _UTC:
+        dt = dt.astimezone(_UTC)
+    
     # Convert to ISO format and replace +00:00 with Z
     iso_string = dt.isoformat(timespec='milliseconds')
     return iso_string.replace('+00:00', 'Z')
@@ -124,6 +305,11 @@ def get_base_url(request: Request) -> str:
     This constructs the base URL from the request's scheme and host.
     Handles both HTTP and HTTPS, and various port configurations.
     
+    The URL is assembled from the ASGI scope and Host header rather than
+    via Starlette's request.base_url (which builds a URL object), and is
+    remembered on request.state so repeat calls within the same request
+    are free.
+    
     Args:
         request (Request): FastAPI request object
     
@@ -134,15 +320,51 @@ def get_base_url(request: Request) -> str:
         >>> get_base_url(request)
         'https://pastebin-lite.onrender.com'
     """
-    # Get base URL from request and remove trailing slash
-    base_url = str(request.base_url).rstrip('/')
+    base_url = getattr(request.state, "base_url", None)
+    if base_url is not None:
+        return base_url
+    
+    scope = request.scope
+    host = _scope_header(scope, b"host")
+    if host:
+        base_url = f"{scope['scheme']}://{host}{scope.get('root_path', '')}"
+    else:
+        # No Host header (HTTP/1.0 clients) - let Starlette work it out
+        # from the server address. Starlette's base_url always ends in
+        # exactly one "/", so slice it off rather than scanning with rstrip
+        base_url = str(request.base_url)
+        if base_url.endswith('/'):
+            base_url = base_url[:-1]
+    
+    request.state.base_url = base_url
     return base_url
 
 
+@lru_cache(maxsize=16)
+def _paste_url_prefix(base_url: str) -> str:
+    """
+    Build (and cache) the URL prefix that paste IDs are appended to.
+    
+    Args:
+        base_url (str): Base URL from get_base_url()
+    
+    Returns:
+        str: Prefix ending in "/p/"
+    
+    Example:
+        >>> _paste_url_prefix("https://pastebin-lite.onrender.com")
+        'https://pastebin-lite.onrender.com/p/'
+    """
+    return f"{base_url}/p/"
+
+
 def build_paste_url(request: Request, paste_id: str) -> str:
     """
     Build the full shareable URL for a paste.
     
+    The "/p/" prefix is cached per base URL, so this only costs one string
+    concatenation on top of get_base_url().
+    
     Args:
         request (Request): FastAPI request object
         paste_id (str): The paste ID
@@ -154,5 +376,27 @@ def build_paste_url(request: Request, paste_id: str) -> str:
         >>> build_paste_url(request, "abc123")
         'https://pastebin-lite.onrender.com/p/abc123'
     """
-    base_url = get_base_url(request)
-    return f"{base_url}/p/{paste_id}"
+    return _paste_url_prefix(get_base_url(request)) + paste_id
+
+
+def build_paste_url_batch(request: Request, paste_ids) -> list:
+    """
+    Build shareable URLs for several pastes at once.
+    
+    The base URL and "/p/" prefix are looked up once for the whole batch,
+    so endpoints that return many pastes don't repeat that work per ID.
+    
+    Args:
+        request (Request): FastAPI request object
+        paste_ids (iterable of str): The paste IDs
+    
+    Returns:
+        list of str: Full URLs, in the same order as paste_ids
+    
+    Example:
+        >>> build_paste_url_batch(request, ["abc123", "xyz789"])
+        ['https://pastebin-lite.onrender.com/p/abc123',
+         'https://pastebin-lite.onrender.com/p/xyz789']
+    """
+    prefix = _paste_url_prefix(get_base_url(request))
+    return [prefix + paste_id for paste_id in paste_ids]